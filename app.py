@@ -1,18 +1,51 @@
+import re
 import streamlit as st
 import pandas as pd
+from io import BytesIO
 
 # === Import processing logic ===
 from logic.srri_monitoring_transformation import process_monitoring_file
-from logic.permalink_transformation import process_and_extract_permalink_file
+from logic.permalink_transformation import process_and_extract_permalink_file, clear_pdf_cache, PDF_CACHE_MAX_AGE
 from logic.compare_and_export import compare_srri_values
 
-# === Utility to clean special characters in all string columns ===
-def clean_special_characters(df):
-    for col in df.select_dtypes(include="object").columns:
-        df[col] = df[col].str.replace(r"[®¬Æ]", "®", regex=True)
+# === Utility to clean special characters in the free-text name columns ===
+_SPECIAL_CHARS_RE = re.compile(r"[®¬Æ]")
+TEXT_COLUMNS = ("FUND", "FUND_NAME", "SUB_FUND", "SHARE_CLASS")
+
+def clean_special_characters(df, cols=TEXT_COLUMNS):
+    for col in cols:
+        if col in df.columns:
+            df[col] = df[col].str.replace(_SPECIAL_CHARS_RE, "®", regex=True)
     return df
 
 
+# === Preview tables only render the first rows (full data is in the downloads) ===
+PREVIEW_ROWS = 200
+
+def preview_dataframe(df, column_config=None):
+    st.dataframe(df.head(PREVIEW_ROWS), use_container_width=True, column_config=column_config)
+    if len(df) > PREVIEW_ROWS:
+        st.caption(f"Showing the first {PREVIEW_ROWS} of {len(df)} rows. Download the file below for the full data.")
+
+
+# === Cached CSV serialization for download buttons (skipped on widget-only reruns) ===
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(df, cols, date_format="%Y-%m-%d"):
+    return df[list(cols)].to_csv(index=False, date_format=date_format).encode("utf-8-sig")
+
+
+# === Cached processing (keyed on uploaded file bytes, so reruns skip PDF fetching) ===
+# Results expire with the downloaded PDFs; the date format only applies on export, so it is not part of the key
+@st.cache_data(show_spinner=False, ttl=PDF_CACHE_MAX_AGE)
+def load_monitoring(file_bytes):
+    return process_monitoring_file(BytesIO(file_bytes))
+
+
+@st.cache_data(show_spinner=False, ttl=PDF_CACHE_MAX_AGE)
+def load_permalink(file_bytes):
+    return process_and_extract_permalink_file(BytesIO(file_bytes))
+
+
 # === Page config ===
 st.set_page_config(page_title="SRRI Update Checker", layout="wide")
 st.title("📊 SRRI Update Checker")
@@ -30,6 +63,16 @@ date_format_label = st.sidebar.selectbox(
 )
 date_format = date_format_options[date_format_label]
 
+# Inception dates stay datetimes; the chosen format is applied when displaying and exporting
+date_column_config = {
+    "SHARE_CLASS_INCEPTION_DATE": st.column_config.DatetimeColumn(format=date_format_label)
+}
+
+# === Sidebar: Reset cached results ===
+if st.sidebar.button("🔄 Reset cached results", help="Clear cached processing so uploaded files are re-read and PDFs re-downloaded."):
+    st.cache_data.clear()
+    clear_pdf_cache()
+
 # === File uploads ===
 file_monitoring = st.file_uploader("Upload SRRI Monitoring Excel", type="xlsx")
 file_permalink = st.file_uploader("Upload Permalink CSV", type="csv")
@@ -40,7 +83,7 @@ if file_monitoring and file_permalink:
 
         # === Step 1: Monitoring file ===
         try:
-            df_monitoring = process_monitoring_file(file_monitoring)
+            df_monitoring = load_monitoring(file_monitoring.getvalue())
             df_monitoring = clean_special_characters(df_monitoring)
         except Exception as e:
             st.error(f"❌ Error processing Monitoring Excel:\n\n{e}")
@@ -48,7 +91,7 @@ if file_monitoring and file_permalink:
 
         # === Step 2: Permalink file and extract PDFs ===
         try:
-            df_permalink = process_and_extract_permalink_file(file_permalink, date_format)
+            df_permalink = load_permalink(file_permalink.getvalue())
             df_permalink = clean_special_characters(df_permalink)
         except Exception as e:
             st.error(f"❌ Error processing Permalink CSV or extracting from PDFs:\n\n{e}")
@@ -56,10 +99,10 @@ if file_monitoring and file_permalink:
 
         # === Step 3: Preview data ===
         with st.expander("🔍 Preview Monitoring Data"):
-            st.dataframe(df_monitoring)
+            preview_dataframe(df_monitoring)
 
         with st.expander("🔍 Preview Permalink Data + Extracted Values"):
-            st.dataframe(df_permalink)
+            preview_dataframe(df_permalink, column_config=date_column_config)
 
         with st.expander("📘 Column Descriptions"):
             st.markdown("""
@@ -82,25 +125,25 @@ if file_monitoring and file_permalink:
         # === Step 4: Download cleaned inputs ===
         st.download_button(
             label="⬇️ Download Processed Monitoring",
-            data=df_monitoring.to_csv(index=False, encoding="utf-8-sig", date_format="%Y-%m-%d"),
+            data=to_csv_bytes(df_monitoring, tuple(df_monitoring.columns)),
             file_name="processed_monitoring_data.csv"
         )
         st.download_button(
             label="⬇️ Download Processed Permalink",
-            data=df_permalink.to_csv(index=False, encoding="utf-8-sig", date_format="%Y-%m-%d"),
+            data=to_csv_bytes(df_permalink, tuple(df_permalink.columns), date_format),
             file_name="processed_permalink_data.csv"
         )
 
         # === Step 5: Compare for mismatches ===
         try:
+            # Text columns come from the already-cleaned permalink frame
             result_df = compare_srri_values(df_monitoring, df_permalink)
-            result_df = clean_special_characters(result_df)
 
             if result_df.empty:
                 st.info("✅ No SRRI mismatches found.")
             else:
                 st.success(f"⚠️ Found {len(result_df)} mismatches.")
-                st.dataframe(result_df)
+                st.dataframe(result_df, column_config=date_column_config)
 
                 # === Step 6: Column selector ===
                 st.markdown("### 🧩 Select Columns to Include in SRRI Update Export")
@@ -123,13 +166,18 @@ if file_monitoring and file_permalink:
                 filtered_export_df = result_df[selected_columns]
 
                 if export_format == "CSV":
-                    export_data = filtered_export_df.to_csv(index=False, encoding="utf-8-sig", date_format="%Y-%m-%d")
+                    export_data = to_csv_bytes(result_df, tuple(selected_columns), date_format)
                     export_mime = "text/csv"
                     export_filename = "srri_updates_needed.csv"
                 else:
                     import io
                     output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+                    # Excel number formats use the same letters as the sidebar label, in lower case
+                    excel_date_format = date_format_label.lower()
+                    with pd.ExcelWriter(
+                        output, engine='xlsxwriter',
+                        date_format=excel_date_format, datetime_format=excel_date_format
+                    ) as writer:
                         filtered_export_df.to_excel(writer, index=False, sheet_name='SRRI Mismatches')
                     export_data = output.getvalue()
                     export_mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
@@ -1,9 +1,14 @@
+import logging
 import pandas as pd
+import numpy as np
 
-def compare_srri_values(monitoring_df, permalink_df, output_file="output/srri_updates_needed.csv"):
+logger = logging.getLogger(__name__)
+
+def compare_srri_values(monitoring_df, permalink_df, output_file=None):
     """
     Compares the KIID_SRRI from the Permalink file with the LATEST_SRRI from the Monitoring file,
-    only for records where Any_16_Weeks_Stable is True. Outputs mismatches to a CSV file.
+    only for records where Any_16_Weeks_Stable is True. Returns the mismatches, and also writes
+    them to a CSV file when output_file is given.
     """
 
     # === STEP 1: Load files (support file paths or DataFrames) ===
@@ -37,35 +42,43 @@ def compare_srri_values(monitoring_df, permalink_df, output_file="output/srri_up
         raise ValueError(f"❌ Permalink file missing columns: {missing_permalink}")
 
     # === STEP 4: Ensure numeric types for SRRI columns ===
+    # No Int8 cast here: a fractional or out-of-range SRRI (e.g. "4.5", "300") must still be reported as a mismatch
     permalink_df["KIID_SRRI"] = pd.to_numeric(permalink_df["KIID_SRRI"], errors="coerce")
     monitoring_df["LATEST_SRRI"] = pd.to_numeric(monitoring_df["LATEST_SRRI"], errors="coerce")
 
 
-    # === STEP 5: Filter monitoring to stable SRRI records only ===
-    stable_monitoring_df = monitoring_df[monitoring_df["ANY_16_WEEKS_STABLE"] == True]
+    # === STEP 5: Filter monitoring to stable SRRI records only (indexed by IDENTIFIER for the join) ===
+    stable_monitoring_df = monitoring_df.loc[
+        monitoring_df["ANY_16_WEEKS_STABLE"] == True, ["IDENTIFIER", "LATEST_SRRI", "WEEK_OF_CHANGE"]
+    ].set_index("IDENTIFIER")
 
-        # === STEP 5.5: Filter out rows in permalink_df where KIID_ISIN_MISMATCH is True ===
+    # === STEP 5.5: Filter out rows in permalink_df where KIID_ISIN_MISMATCH is True ===
     if "KIID_ISIN_MISMATCH" in permalink_df.columns:
         permalink_df = permalink_df[permalink_df["KIID_ISIN_MISMATCH"] != True]
 
-    # === STEP 6: Merge on IDENTIFIER (inner join) ===
-    merged_df = pd.merge(
-        permalink_df,
-        stable_monitoring_df[["IDENTIFIER", "LATEST_SRRI", "WEEK_OF_CHANGE"]],
-        on="IDENTIFIER",
-        how="inner"
+    # === STEP 6: Join on IDENTIFIER index (inner join) ===
+    # validate="m:1": a repeated monitoring IDENTIFIER raises instead of silently duplicating mismatches
+    merged_df = (
+        permalink_df
+        .set_index("IDENTIFIER")
+        .join(stable_monitoring_df, how="inner", validate="m:1")
+        .reset_index()
     )
 
-    # === STEP 7: Drop rows where either SRRI value is missing (validation) ===
-    merged_df = merged_df.dropna(subset=["KIID_SRRI", "LATEST_SRRI"])
-
-        # === STEP 7.5: Keep only rows where KIID_ISIN_MISMATCH is False or missing ===
+    # === STEP 7: Keep only rows where KIID_ISIN_MISMATCH is False or missing ===
     if "KIID_ISIN_MISMATCH" in merged_df.columns:
         merged_df = merged_df[merged_df["KIID_ISIN_MISMATCH"] == False]
 
 
-    # === STEP 8: Find SRRI mismatches ===
-    mismatches_df = merged_df[merged_df["KIID_SRRI"] != merged_df["LATEST_SRRI"]]
+    # === STEP 8: Find SRRI mismatches (both values present and different) in a single pass ===
+    kiid_srri = merged_df["KIID_SRRI"]
+    latest_srri = merged_df["LATEST_SRRI"]
+    mismatch_mask = (
+        kiid_srri.notna().to_numpy()
+        & latest_srri.notna().to_numpy()
+        & (kiid_srri.to_numpy(dtype="float64", na_value=np.nan) != latest_srri.to_numpy(dtype="float64", na_value=np.nan))
+    )
+    mismatches_df = merged_df.iloc[np.flatnonzero(mismatch_mask)]
 
     # === STEP 9: Keep only relevant columns (if present) ===
     preferred_order = [
@@ -82,14 +95,14 @@ def compare_srri_values(monitoring_df, permalink_df, output_file="output/srri_up
         result_df[col] = result_df[col].str.replace("¬Æ", "®", regex=False)
 
 
-    # === STEP 10: Export mismatches ===
-    result_df.to_csv(output_file, index=False, encoding="utf-8-sig", date_format="%Y-%m-%d")
-    #result_df.to_csv(output_file, index=False, date_format="%Y-%m-%d")
-    print(f"✅ Mismatch report saved to: {output_file} ({len(result_df)} rows)")
-    print(result_df.dtypes)
+    # === STEP 10: Export mismatches (only when an output file is requested) ===
+    if output_file is not None:
+        result_df.to_csv(output_file, index=False, encoding="utf-8-sig", date_format="%Y-%m-%d")
+        print(f"✅ Mismatch report saved to: {output_file} ({len(result_df)} rows)")
+    logger.debug("dtypes=%s", result_df.dtypes.to_dict())
 
     return result_df
 
 
 # Example usage
-# compare_srri_values("output/srri_monitoring_tsfm.csv", "output/permalink_tsfm.csv")
\ No newline at end of file
+# compare_srri_values("output/srri_monitoring_tsfm.csv", "output/permalink_tsfm.csv", output_file="output/srri_updates_needed.csv")
\ No newline at end of file
@@ -1,210 +1,323 @@
+import hashlib
+import logging
+import os
 import pandas as pd
 import re
 import requests
-import pdfplumber
 import fitz  # PyMuPDF
+import shutil
+import threading
+import time
 from io import BytesIO
-
-"""KIID FILE ISIN & Fact Sheet URL Extraction Logic"""
+from cachetools import TTLCache, cached
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# === Regex patterns (compiled once, reused for every line / row / PDF) ===
+_KIID_URL_RE = re.compile(r"(https?://\S+?KIID\.pdf)")
+_FACTSHEET_URL_RE = re.compile(r"(https?://\S+?FactSheet\.pdf)")
+_ISIN_RE = re.compile(r"\b(IE[0-9A-Z]{10})\b")
+
+_UCITS_RE = re.compile(r'(ucits|ucts)(\s*etf)?', re.IGNORECASE)
+_SPECIAL_CHARS_RE = re.compile(r'[®¬Æ]')
+_NONALPHA_RE = re.compile(r'[^a-z]')
+_HEDGED_RE = re.compile(r'([a-z]{3})\s*\(hedged\)')
+
+# KIID fields are found with separate searches on purpose: in CPython's re a combined
+# alternation disables the literal-prefix scan and benchmarks slower than three searches
+_SRRI_SPLIT_RE = re.compile(r"Risk and Reward Profile\s*1\s*2\s*3\s*4\s*5\s*6\s*7", re.IGNORECASE)
+_SRRI_DIGIT_RE = re.compile(r"\b[1-7]\b")
+_SRRI_FALLBACK_RES = [
+    re.compile(r'risk.*?([1-7])', re.IGNORECASE),
+    re.compile(r'category\s+(\d)\s+reflects', re.IGNORECASE),
+]
+_FEE_RE = re.compile(r"Ongoing charges[^%]{0,100}?(\d{1,2}(?:\.\d{1,2})?)\s?%", re.IGNORECASE)
+_KIID_ISIN_RE = re.compile(r"ISIN\s*[:\-]?\s*(IE[0-9A-Z]{10})")
+_FACTSHEET_ISIN_RE = re.compile(r"ISIN\s+(IE[0-9A-Z]{10})")
+_INCEPTION_RE = re.compile(
+    r"Share Class Inception\s*[:\-]?\s*([\d]{1,2}[./ -][\d]{1,2}[./ -][\d]{2,4}|[\d]{1,2} [A-Za-z]{3,9} \d{4})"
+)
+
+# PDF fetching is network-bound, so downloads run on a thread pool sharing one pooled session
+MAX_DOWNLOAD_WORKERS = 16
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+# PyMuPDF is not thread-safe, so only the downloads overlap; parsing is serialized
+_pdf_parse_lock = threading.Lock()
+
+
+# Downloaded PDFs are kept on disk so reruns skip the network; KIIDs are reissued when
+# the SRRI changes, so cached copies expire instead of being reused forever
+PDF_CACHE_DIR = Path("cache")
+PDF_CACHE_MAX_AGE = 24 * 60 * 60  # seconds
+
+
+def _pdf_cache_path(url):
+    return PDF_CACHE_DIR / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.pdf"
+
+
+def _store_cached_pdf(cache_path, buffer):
+    # Write to a temp file and rename, so a concurrent run never reads a half-written PDF
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.debug("Could not cache %s: %s", cache_path, e)
+
+
+def _fetch_pdf(url, timeout):
+    cache_path = _pdf_cache_path(url)
+    try:
+        if time.time() - cache_path.stat().st_mtime < PDF_CACHE_MAX_AGE:
+            return BytesIO(cache_path.read_bytes())
+    except OSError:
+        pass  # Not cached yet (or unreadable), so download it
+
+    # Stream the body straight into one buffer that PyMuPDF reads from (no .content copy)
+    buffer = BytesIO()
+    with _session.get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        shutil.copyfileobj(response.raw, buffer)
+
+    # Error pages served with a 200 must not be cached as PDFs (the header may follow a few junk bytes)
+    if b"%PDF-" not in bytes(buffer.getbuffer()[:1024]):
+        raise ValueError("response is not a PDF")
+    _store_cached_pdf(cache_path, buffer)
+    buffer.seek(0)
+    return buffer
+
+
+# === KIID: search the primary SRRI pattern, fee and ISIN in (partial) text ===
+# Fields already found are passed back in and not searched again: a match in the first pages
+# is still the first match once later pages are appended
+def _search_kiid_fields(text, srri_value=None, management_fee=None, kiid_isin=None):
+    # Extract SRRI using typical pattern after risk scale
+    if srri_value is None:
+        parts = _SRRI_SPLIT_RE.split(text)
+        if len(parts) >= 2:
+            srri_match = _SRRI_DIGIT_RE.search(parts[1])
+            if srri_match:
+                srri_value = int(srri_match.group())
+
+    # Extract Management Fee from "Ongoing charges"
+    if management_fee is None:
+        fee_match = _FEE_RE.search(text)
+        if fee_match:
+            management_fee = float(fee_match.group(1))
+
+    # Extract ISIN from inside PDF
+    if kiid_isin is None:
+        isin_match = _KIID_ISIN_RE.search(text)
+        if isin_match:
+            kiid_isin = isin_match.group(1)
+
+    return srri_value, management_fee, kiid_isin
+
+
+# === KIID: download + parse, cached by URL (failed downloads raise and are not cached) ===
+# Extracted fields expire together with the downloaded PDFs
+@cached(cache=TTLCache(maxsize=4096, ttl=PDF_CACHE_MAX_AGE), lock=threading.Lock())
+def _extract_kiid_fields(url):
+    pdf_buffer = _fetch_pdf(url, timeout=20)
+
+    # Fields sit on the first pages, so stop extracting text once all of them are found
+    with _pdf_parse_lock:
+        with fitz.open(stream=pdf_buffer, filetype="pdf") as doc:
+            text = ""
+            srri_value = management_fee = kiid_isin = None
+            for page in doc:
+                text += page.get_text("text")
+                srri_value, management_fee, kiid_isin = _search_kiid_fields(
+                    text, srri_value, management_fee, kiid_isin
+                )
+                if None not in (srri_value, management_fee, kiid_isin):
+                    break
+
+    # Looser SRRI fallbacks (text is the whole document whenever the primary pattern missed)
+    if srri_value is None:
+        for pattern in _SRRI_FALLBACK_RES:
+            match = pattern.search(text)
+            if match:
+                srri_value = int(match.group(1))
+                break
+
+    return srri_value, management_fee, kiid_isin
+
+
+def extract_srri_and_fee(url):
+    try:
+        return _extract_kiid_fields(url)
+    except Exception as e:
+        print(f"❌ Failed to extract SRRI, Fee, or ISIN for {url}: {e}")
+        return None, None, None
+
+
+# === Fact Sheet: download + parse once for inception date and ISIN, cached by URL ===
+@cached(cache=TTLCache(maxsize=4096, ttl=PDF_CACHE_MAX_AGE), lock=threading.Lock())
+def _extract_factsheet_fields(url):
+    pdf_buffer = _fetch_pdf(url, timeout=15)
+
+    # Both fields are usually on page 1; later pages are only read while one is missing
+    with _pdf_parse_lock:
+        with fitz.open(stream=pdf_buffer, filetype="pdf") as doc:
+            text = ""
+            inception_match = isin_match = None
+            for page in doc:
+                text += page.get_text("text")
+                inception_match = inception_match or _INCEPTION_RE.search(text)
+                # Look for: ISIN IE00XXXXXXXX
+                isin_match = isin_match or _FACTSHEET_ISIN_RE.search(text)
+                if inception_match and isin_match:
+                    break
+
+    inception_date = pd.to_datetime(inception_match.group(1), dayfirst=True, errors="coerce") if inception_match else None
+    factsheet_isin = isin_match.group(1) if isin_match else None
+
+    return inception_date, factsheet_isin
+
+
+def extract_factsheet_fields(url):
+    try:
+        if not isinstance(url, str) or not url.startswith("http"):
+            return None, None
+        return _extract_factsheet_fields(url)
+    except Exception as e:
+        print(f"❌ Failed to extract inception date or ISIN from factsheet for {url}: {e}")
+        return None, None
+
+
+def clear_pdf_cache():
+    # Forget extracted fields and downloaded files so the next run fetches every PDF again
+    _extract_kiid_fields.cache_clear()
+    _extract_factsheet_fields.cache_clear()
+    shutil.rmtree(PDF_CACHE_DIR, ignore_errors=True)
+
+
+# === KIID FILE ISIN & Fact Sheet URL Extraction Logic ===
 
 def process_and_extract_permalink_file(file, date_format="%Y-%m-%d", output_path="output/permalink_tsfm.csv"):
-    # === STEP 1: Read raw file content (from string path or UploadedFile) ===
+    # === STEP 1: Read raw file bytes (from string path or UploadedFile) ===
     if isinstance(file, str):
-        with open(file, 'r', encoding='utf-8-sig') as f:
+        with open(file, 'rb') as f:
             content = f.read()
     else:
-        content = file.read().decode('utf-8-sig')
-    
-    lines = content.splitlines()
+        content = file.read()
 
     # === STEP 2: Filter KIID and Fact Sheet URLs (English + UK variants only) ===
-    kiid_lines = [line for line in lines if "UCITS KIID" in line and "KIID.pdf" in line and "English" in line and ("UK Professional Investor" in line or "UK Retail Investor" in line)]
-    factsheet_lines = [line for line in lines if "Fact Sheet" in line and "FactSheet.pdf" in line and "English" in line and ("UK Professional Investor" in line or "UK Retail Investor" in line)]
-
-    # === STEP 3: Parse KIID data lines ===
-    kiid_data = []
-    for line in kiid_lines:
-        url = re.search(r"https?://\S+?KIID\.pdf", line)
-        isin = re.search(r"\bIE[0-9A-Z]{10}\b", line)
-        fields = line.strip('"').split(',')
-
-        if url and isin and len(fields) >= 4:
-            fund_name = fields[1].strip()
-            third, fourth = fields[2].strip(), fields[3].strip()
-            share_class = third if fourth.startswith("IE") else f"{third} - {fourth}"
-
-            kiid_data.append({
-                "Line": line,
-                "Fund Name": fund_name,
-                "Share Class": share_class,
-                "ISIN": isin.group(),
-                "KIID PDF URL": url.group()
-            })
-
-    kiid_df = pd.DataFrame(kiid_data)
-
-    # === STEP 4: Parse Fact Sheet lines ===
-    factsheet_data = []
-    for line in factsheet_lines:
-        url = re.search(r"https?://\S+?FactSheet\.pdf", line)
-        isin = re.search(r"\bIE[0-9A-Z]{10}\b", line)
-        if url and isin:
-            factsheet_data.append({
-                "ISIN": isin.group(),
-                "Fact Sheet URL": url.group()
-            })
-
-    factsheet_df = pd.DataFrame(factsheet_data).drop_duplicates(subset="ISIN")
-
-    # === STEP 5: Merge KIID and FactSheet metadata on ISIN ===
-    merged_df = kiid_df.merge(factsheet_df, on="ISIN", how="left")
+    # Lines are tested as bytes and only the kept ones are decoded ("-sig" drops a leading BOM)
+    kiid_lines = []
+    factsheet_lines = []
+    for line in content.splitlines():
+        if b"English" not in line or not (b"UK Professional Investor" in line or b"UK Retail Investor" in line):
+            continue
+        if b"UCITS KIID" in line and b"KIID.pdf" in line:
+            kiid_lines.append(line.decode("utf-8-sig"))
+        if b"Fact Sheet" in line and b"FactSheet.pdf" in line:
+            factsheet_lines.append(line.decode("utf-8-sig"))
+
+    # === STEP 3: Parse KIID data lines (vectorized split + URL/ISIN extraction) ===
+    kiid_series = pd.Series(kiid_lines, dtype="object")
+    kiid_urls = kiid_series.str.extract(_KIID_URL_RE, expand=False)
+    kiid_isins = kiid_series.str.extract(_ISIN_RE, expand=False)
+    fields = kiid_series.str.strip('"').str.split(",", n=4, expand=True).reindex(columns=range(4))
+
+    fund_names = fields[1].str.strip()
+    third, fourth = fields[2].str.strip(), fields[3].str.strip()
+    share_classes = third.where(fourth.str.startswith("IE", na=False), third + " - " + fourth)
+
+    valid = kiid_urls.notna() & kiid_isins.notna() & fields[3].notna()
+    kiid_df = pd.DataFrame({
+        "Fund Name": fund_names,
+        "Share Class": share_classes,
+        "ISIN": kiid_isins,
+        "KIID PDF URL": kiid_urls
+    })[valid].reset_index(drop=True)
+
+    # === STEP 4: Parse Fact Sheet lines into an ISIN -> URL lookup (first URL per ISIN) ===
+    factsheet_series = pd.Series(factsheet_lines, dtype="object")
+    factsheet_isins = factsheet_series.str.extract(_ISIN_RE, expand=False)
+    factsheet_urls = factsheet_series.str.extract(_FACTSHEET_URL_RE, expand=False)
+
+    found = factsheet_isins.notna() & factsheet_urls.notna()
+    factsheet_url_by_isin = pd.Series(factsheet_urls[found].to_numpy(), index=factsheet_isins[found], dtype="object")
+    factsheet_url_by_isin = factsheet_url_by_isin[~factsheet_url_by_isin.index.duplicated()]
+
+    # === STEP 5: Look up each KIID row's Fact Sheet URL by ISIN ===
+    kiid_df["Fact Sheet URL"] = kiid_df["ISIN"].map(factsheet_url_by_isin)
 
     # === STEP 6: Create a cleaned identifier from Share Class text ===
-    def clean_identifier(name):
-        if pd.isna(name):
-            return ""
-        original = name
-        name = name.lower()
-        name = re.sub(r'(ucits|ucts)(\s*etf)?', '', name, flags=re.IGNORECASE)
-        name = re.sub(r'[®¬Æ]', '', name).replace('class ', '').replace('accu', 'acc')
-        name = re.sub(r'[^a-z]', '', name)
-
-        hedged_suffix = re.search(r'([a-z]{3})\s*\(hedged\)', original.lower())
-        if hedged_suffix:
-            name += hedged_suffix.group(1) + 'hedged'
-
-        if not original.lower().startswith("first trust"):
-            name = "firsttrust" + name
-
-        return name
-
-    merged_df["Identifier"] = merged_df["Share Class"].apply(clean_identifier)
-
-    # === STEP 7: Extract SRRI, Management Fee, and ISIN from inside the KIID PDF ===
-    def extract_srri_and_fee(url):
-        srri_value = None
-        management_fee = None
-        kiid_isin = None
-        try:
-            response = requests.get(url, timeout=20)
-            response.raise_for_status()
-            pdf_bytes = response.content
-
-            # Try with pdfplumber first
-            with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-                text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-
-            # Extract SRRI using typical pattern after risk scale
-            parts = re.split(r"Risk and Reward Profile\s*1\s*2\s*3\s*4\s*5\s*6\s*7", text, flags=re.IGNORECASE)
-            if len(parts) >= 2:
-                srri_match = re.search(r"\b[1-7]\b", parts[1])
-                if srri_match:
-                    srri_value = int(srri_match.group())
-
-            # Extract Management Fee from "Ongoing charges"
-            fee_match = re.search(r"Ongoing charges[^%]{0,100}?(\d{1,2}(?:\.\d{1,2})?)\s?%", text, re.IGNORECASE)
-            if fee_match:
-                management_fee = float(fee_match.group(1))
-
-            # Extract ISIN from inside PDF
-            isin_match = re.search(r"ISIN\s*[:\-]?\s*(IE[0-9A-Z]{10})", text)
-            if isin_match:
-                kiid_isin = isin_match.group(1)
-
-            # === Fallback to PyMuPDF if needed ===
-            if srri_value is None or management_fee is None or kiid_isin is None:
-                doc = fitz.open(stream=BytesIO(pdf_bytes), filetype="pdf")
-                full_text = "".join(page.get_text() for page in doc)
-
-                if srri_value is None:
-                    for pattern in [r'risk.*?([1-7])', r'category\s+(\d)\s+reflects']:
-                        match = re.search(pattern, full_text, re.IGNORECASE)
-                        if match:
-                            srri_value = int(match.group(1))
-                            break
-
-                if management_fee is None:
-                    fee_match = re.search(r"Ongoing charges[^%]{0,100}?(\d{1,2}(?:\.\d{1,2})?)\s?%", full_text, re.IGNORECASE)
-                    if fee_match:
-                        management_fee = float(fee_match.group(1))
-
-                if kiid_isin is None:
-                    isin_match = re.search(r"ISIN\s*[:\-]?\s*(IE[0-9A-Z]{10})", full_text)
-                    if isin_match:
-                        kiid_isin = isin_match.group(1)
-
-        except Exception as e:
-            print(f"❌ Failed to extract SRRI, Fee, or ISIN for {url}: {e}")
-
-        return pd.Series({
-            "KIID_SRRI": srri_value,
-            "Management_FEE": management_fee,
-            "KIID_ISIN": kiid_isin  # ✅ renamed here
-        })
-
-    # === STEP 8: Extract Share Class Inception Date from Fact Sheet PDF ===
-    def extract_inception_date(url):
-        try:
-            if not isinstance(url, str) or not url.startswith("http"):
-                return None
-            response = requests.get(url, timeout=15)
-            response.raise_for_status()
-            doc = fitz.open(stream=BytesIO(response.content), filetype="pdf")
-            text = "".join(page.get_text() for page in doc)
-            match = re.search(
-                r"Share Class Inception\s*[:\-]?\s*([\d]{1,2}[./ -][\d]{1,2}[./ -][\d]{2,4}|[\d]{1,2} [A-Za-z]{3,9} \d{4})",
-                text
-            )
-            return pd.to_datetime(match.group(1), dayfirst=True, errors="coerce") if match else None
-        except Exception as e:
-            print(f"❌ Failed to extract inception date for {url}: {e}")
-            return None
-
-
-
-    # === STEP 9b: Extract ISIN from Fact Sheet PDF ===
-    def extract_isin_from_factsheet(url):
-        try:
-            if not isinstance(url, str) or not url.startswith("http"):
-                return None
-            response = requests.get(url, timeout=15)
-            response.raise_for_status()
-            doc = fitz.open(stream=BytesIO(response.content), filetype="pdf")
-            text = "".join(page.get_text() for page in doc)
-
-            # Look for: ISIN IE00XXXXXXXX
-            match = re.search(r"ISIN\s+(IE[0-9A-Z]{10})", text)
-            return match.group(1) if match else None
-        except Exception as e:
-            print(f"❌ Failed to extract ISIN from factsheet for {url}: {e}")
-            return None
-
-
-     # === STEP 9: Apply Extraction Logic ===
-    srri_fee_df = merged_df["KIID PDF URL"].apply(extract_srri_and_fee)
-    inception_series = merged_df["Fact Sheet URL"].apply(extract_inception_date)
-    factsheet_isin_series = merged_df["Fact Sheet URL"].apply(extract_isin_from_factsheet)
-
-    # === STEP 10: Combine All Data ===
-    final_df = pd.concat([merged_df, srri_fee_df], axis=1)
-    final_df["Share_Class_Inception_Date"] = pd.to_datetime(inception_series, errors="coerce")
-    final_df["Share_Class_Inception_Date"] = final_df["Share_Class_Inception_Date"].dt.strftime(date_format)
-
-    final_df["KIID_SRRI"] = pd.to_numeric(final_df["KIID_SRRI"], errors="coerce").astype("Int64")
+    def clean_identifier(names):
+        lowered = names.fillna("").astype(str).str.lower()
+        cleaned = (
+            lowered
+            .str.replace(_UCITS_RE, "", regex=True)
+            .str.replace(_SPECIAL_CHARS_RE, "", regex=True)
+            .str.replace("class ", "", regex=False)
+            .str.replace("accu", "acc", regex=False)
+            .str.replace(_NONALPHA_RE, "", regex=True)
+        )
+
+        hedged_suffix = lowered.str.extract(_HEDGED_RE, expand=False)
+        cleaned = cleaned + (hedged_suffix + "hedged").fillna("")
+
+        cleaned = cleaned.where(lowered.str.startswith("first trust"), "firsttrust" + cleaned)
+        return cleaned.where(names.notna(), "")
+
+    kiid_df["Identifier"] = clean_identifier(kiid_df["Share Class"])
+
+    # === STEP 7: Extract PDF fields once per unique URL (downloads run concurrently) ===
+    kiid_urls = kiid_df["KIID PDF URL"].dropna().unique().tolist()
+    factsheet_urls = kiid_df["Fact Sheet URL"].dropna().unique().tolist()
+
+    # Both batches are submitted before collecting, so FactSheet GETs don't wait for the last KIID
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        kiid_futures = executor.map(extract_srri_and_fee, kiid_urls)
+        factsheet_futures = executor.map(extract_factsheet_fields, factsheet_urls)
+        kiid_results = dict(zip(kiid_urls, kiid_futures))
+        factsheet_results = dict(zip(factsheet_urls, factsheet_futures))
+
+    # === STEP 8: Map extracted values back onto every row ===
+    srri_fee_df = pd.DataFrame(
+        [kiid_results[url] for url in kiid_df["KIID PDF URL"]],
+        index=kiid_df.index,
+        columns=["KIID_SRRI", "Management_FEE", "KIID_ISIN"]
+    )
+    factsheet_fields_df = pd.DataFrame(
+        [factsheet_results.get(url, (None, None)) for url in kiid_df["Fact Sheet URL"]],
+        index=kiid_df.index,
+        columns=["Share_Class_Inception_Date", "FACTSHEET_ISIN"]
+    )
+
+    # === STEP 9: Combine All Data ===
+    final_df = pd.concat([kiid_df, srri_fee_df], axis=1)
+    final_df["Share_Class_Inception_Date"] = pd.to_datetime(factsheet_fields_df["Share_Class_Inception_Date"], errors="coerce")
+
+    final_df["KIID_SRRI"] = pd.to_numeric(final_df["KIID_SRRI"], errors="coerce").astype("Int8")
     final_df["Management_FEE"] = pd.to_numeric(final_df["Management_FEE"], errors="coerce").astype("float64")
-    final_df["FACTSHEET_ISIN"] = factsheet_isin_series
+    final_df["FACTSHEET_ISIN"] = factsheet_fields_df["FACTSHEET_ISIN"]
 
-    # === STEP 10b: Add ISIN mismatch flags ===
+    # === STEP 9b: Add ISIN mismatch flags ===
     final_df["KIID_ISIN_MISMATCH"] = final_df["KIID_ISIN"] != final_df["ISIN"]
     final_df["FACTSHEET_ISIN_MISMATCH"] = final_df["FACTSHEET_ISIN"] != final_df["ISIN"]
 
-    # === STEP 10c: Print SRRI value issues (invalid range) ===
+    # === STEP 9c: Print SRRI value issues (invalid range) ===
     invalid_srri_rows = final_df[~final_df["KIID_SRRI"].isin([1, 2, 3, 4, 5, 6, 7])]
     if not invalid_srri_rows.empty:
         print(f"⚠️ {len(invalid_srri_rows)} entries have invalid SRRI values:")
         print(invalid_srri_rows[["ISIN", "KIID_SRRI", "Fund Name", "Share Class"]].head())  # adjust casing if needed
 
-    # === STEP 10d: Print duplicate ISIN warnings ===
+    # === STEP 9d: Print duplicate ISIN warnings ===
     duplicated_isins = final_df["ISIN"][final_df["ISIN"].duplicated(keep=False)]
     if not duplicated_isins.empty:
         print(f"⚠️ {duplicated_isins.nunique()} unique ISINs appear more than once:")
@@ -214,20 +327,17 @@ def process_and_extract_permalink_file(file, date_format="%Y-%m-%d", output_path
         )
 
 
-    # === STEP 11: Clean up + Deduplicate ===
-    string_cols = ["Line", "Fund Name", "Share Class", "ISIN", "KIID PDF URL", "Fact Sheet URL", "Identifier"]
-    final_df[string_cols] = final_df[string_cols].astype(str)
-
-    final_df = final_df[final_df["Share Class"].str.strip().ne("") & final_df["KIID_SRRI"].notna()]
-    final_df = final_df.drop_duplicates(subset="Identifier", keep="first")
+    # === STEP 10: Clean up + Deduplicate ===
+    # Text columns are already strings from parsing; only Fact Sheet URL can be missing (left empty)
+    keep_mask = final_df["Share Class"].str.strip().ne("") & final_df["KIID_SRRI"].notna()
+    final_df = final_df.loc[keep_mask].drop_duplicates(subset="Identifier", keep="first")
 
-    # === STEP 12: Standardize Output Columns and Save ===
+    # === STEP 11: Standardize Output Columns and Save ===
     final_df.columns = final_df.columns.str.upper().str.replace(" ", "_").str.replace("-", "_")
     final_df.to_csv(output_path, index=False, encoding="utf-8-sig", date_format=date_format)
 
     print(f"✅ Output saved to {output_path}")
-    print(final_df.dtypes)
-    print(final_df.head())
+    logger.debug("dtypes=%s", final_df.dtypes.to_dict())
 
     return final_df
 
@@ -1,132 +1,139 @@
+import logging
 import pandas as pd
+import numpy as np
 import re
 
+logger = logging.getLogger(__name__)
+
+# === Regex patterns (compiled once, reused for every row) ===
+_WEEKNUM_RE = re.compile(r"Week\s*\d+")
+_UCITS_ETF_RE = re.compile(r'ucits\s+etf', re.IGNORECASE)
+_SPECIAL_CHARS_RE = re.compile(r'[®¬Æ]')
+_HEDGED_RE = re.compile(r'([a-z]{3})\s*\(hedged\)')
+_NONALPHA_RE = re.compile(r'[^a-z]')
+
 def process_monitoring_file(file):
     # === STEP 1: Load raw Excel ===
     raw_df = pd.read_excel(file, header=None)
 
-    # === STEP 2: Construct headers ===
-    week_row = raw_df.iloc[0]
-    label_row = raw_df.iloc[1]
-    multi_headers = [
-        f"{label} ({week})" if not pd.isna(week) else label
-        for week, label in zip(week_row, label_row)
-    ]
-
-    # === STEP 3: Assign headers and extract data rows ===
-    df = raw_df.iloc[2:].copy()
-    df.columns = multi_headers
-
-    # === STEP 4: Normalize SRRI Result column names ===
-    adjusted_columns = []
+    # === STEP 2: Construct headers (from the two header rows only) ===
+    # "SRRI Result" columns carry no week of their own, so they take the week of the "SRRI Report" before them
+    headers = []
     last_week = None
-    for col in df.columns:
+    for week, label in zip(raw_df.iloc[0], raw_df.iloc[1]):
+        col = f"{label} ({week})" if not pd.isna(week) else label
         if "SRRI Report" in col:
             last_week = col.split("(")[-1].replace(")", "").strip()
-            adjusted_columns.append(col)
         elif col == "SRRI Result" and last_week:
-            adjusted_columns.append(f"SRRI Result ({last_week})")
-        else:
-            adjusted_columns.append(col)
-    df.columns = adjusted_columns
+            col = f"SRRI Result ({last_week})"
+        headers.append(col)
+
+    # === STEP 3: Assign headers and extract data rows ===
+    df = raw_df.iloc[2:].copy()
+    df.columns = headers
 
-    # === STEP 5: Identify SRRI columns ===
+    # === STEP 4: Identify SRRI columns ===
     srri_columns = [col for col in df.columns if "SRRI Result (Week" in col]
 
-    # === STEP 6: Validate sufficient SRRI history (at least 16 values) ===
-    df["Valid_SRRI_Count"] = df[srri_columns].notna().sum(axis=1)
+    # === STEP 5: Validate sufficient SRRI history (at least 16 values) ===
+    # The not-null mask is computed once here and reused by the stability and change-info steps
+    srri_notna = df[srri_columns].notna().to_numpy()
+    has_srri_history = np.count_nonzero(srri_notna, axis=1) >= 16
 
     """    🔍 TESTING PURPOSES ONLY: Print rows that will be dropped before filtering
     
-    insufficient_srri_df = df[df["Valid_SRRI_Count"] < 16]
+    insufficient_srri_df = df[~has_srri_history]
     if not insufficient_srri_df.empty:
         print("❌ The following rows were dropped due to fewer than 16 SRRI values:\n")
         for idx, row in insufficient_srri_df.iterrows():
             fund = row.get("Fund", "N/A")
             share_class = row.get("Share Class", "N/A")
-            count = row["Valid_SRRI_Count"]
+            count = row[srri_columns].notna().sum()
             print(f" - Fund: {fund}, Share Class: {share_class}, SRRI values: {count}")
 
             """
 
-    df = df[df["Valid_SRRI_Count"] >= 16].copy()
-    df.drop(columns="Valid_SRRI_Count", inplace=True)
-
-    # === STEP 7: Add SRRI Stability Columns ===
-    def is_last_16_weeks_stable(row):
-        values = row[srri_columns].dropna().astype(str).tolist()[-16:]
-        return len(values) == 16 and len(set(values)) == 1
-
-    def has_any_16_week_stability(row):
-        values = row[srri_columns].dropna().astype(str).tolist()
-        for i in range(len(values) - 15):
-            if len(set(values[i:i + 16])) == 1:
-                return True
-        return False
-
-    df["Last_16_Weeks_Stable"] = df.apply(is_last_16_weeks_stable, axis=1)
-    df["Any_16_Weeks_Stable"] = df.apply(has_any_16_week_stability, axis=1)
-
-    # === STEP 8: Extract SRRI change info ===
-    def extract_srri_change_info(row):
-        srri_series = row[srri_columns].dropna()
-        srri_values = srri_series.astype(str).tolist()
-        week_names = srri_series.index.tolist()
-
-        latest_srri = previous_srri = change_week = change_date = None
-
-        if srri_values:
-            latest_srri = srri_values[-1]
-            previous_srri = next((v for v in reversed(srri_values[:-1]) if v != latest_srri), latest_srri)
-
-            for i in range(len(srri_values) - 2, -1, -1):
-                if srri_values[i] != latest_srri:
-                    change_week = week_names[i + 1]
-                    change_col = change_week.replace("SRRI Result", "SRRI Report")
-                    change_date = row.get(change_col)
-                    break
-
-        return pd.Series({
-            "Previous SRRI": previous_srri,
-            "Latest SRRI": latest_srri,
-            "Week of SRRI Change": (
-                re.search(r"Week\s*\d+", change_week).group(0)
-                if isinstance(change_week, str) and re.search(r"Week\s*\d+", change_week)
-                else None
-            ),
-            "Date of SRRI Change": change_date
-        })
-
-    df = pd.concat([df, df.apply(extract_srri_change_info, axis=1)], axis=1)
-
-    # === STEP 9: Validate necessary columns for identifier creation ===
+    df = df.loc[has_srri_history].copy()
+    srri_notna = srri_notna[has_srri_history]
+
+    # === STEP 6: Add SRRI Stability Columns ===
+    # Non-null SRRI values (compared as strings) packed to the left of each row, in week order
+    srri_values = df[srri_columns].astype(str).to_numpy()
+    week_order = np.argsort(~srri_notna, axis=1, kind="stable")
+    packed = np.take_along_axis(srri_values, week_order, axis=1)
+    valid_counts = srri_notna.sum(axis=1)
+    in_history = np.arange(packed.shape[1]) < valid_counts[:, None]
+
+    # Last 16 weeks stable: the last 16 non-null values all equal the latest one
+    last_16_idx = np.clip(valid_counts[:, None] - 16 + np.arange(16), 0, None)
+    last_16 = np.take_along_axis(packed, last_16_idx, axis=1)
+    last_16_stable = (valid_counts >= 16) & (last_16 == last_16[:, -1:]).all(axis=1)
+
+    # Any 16 weeks stable: longest run of equal consecutive non-null values is at least 16
+    same_as_next = (packed[:, 1:] == packed[:, :-1]) & in_history[:, 1:]
+    run = longest_run = np.zeros(len(df), dtype=int)
+    for week in range(same_as_next.shape[1]):
+        run = np.where(same_as_next[:, week], run + 1, 0)
+        longest_run = np.maximum(longest_run, run)
+
+    df["Last_16_Weeks_Stable"] = last_16_stable
+    df["Any_16_Weeks_Stable"] = longest_run >= 15
+
+    # === STEP 7: Extract SRRI change info ===
+    rows = np.arange(len(df))
+    latest_srri = np.where(valid_counts > 0, packed[rows, np.maximum(valid_counts - 1, 0)], None)
+
+    # The SRRI changed in the week after the last value that differs from the latest one
+    differs = (packed != latest_srri[:, None]) & in_history
+    changed = differs.any(axis=1)
+    last_differing = packed.shape[1] - 1 - np.argmax(differs[:, ::-1], axis=1)
+    change_col_idx = week_order[rows, np.minimum(last_differing + 1, packed.shape[1] - 1)]
+    previous_srri = np.where(changed, packed[rows, last_differing], latest_srri)
+
+    # "Week N" labels and report dates are looked up once per SRRI column, not per row
+    week_labels = np.array([
+        match.group(0) if match else None
+        for match in (_WEEKNUM_RE.search(col) for col in srri_columns)
+    ], dtype=object)
+    report_dates = np.full(packed.shape, None, dtype=object)
+    for i, col in enumerate(srri_columns):
+        report_col = col.replace("SRRI Result", "SRRI Report")
+        if report_col in df.columns:
+            report_dates[:, i] = df[report_col].to_numpy(dtype=object)
+
+    df["Previous SRRI"] = previous_srri
+    df["Latest SRRI"] = latest_srri
+    df["Week of SRRI Change"] = np.where(changed, week_labels[change_col_idx], None)
+    df["Date of SRRI Change"] = np.where(changed, report_dates[rows, change_col_idx], None)
+
+    # === STEP 8: Validate necessary columns for identifier creation ===
     required_cols = {"Share Class", "Currency"}
     if not required_cols.issubset(set(df.columns)):
         raise ValueError(f"Missing required columns for identifier generation: {required_cols - set(df.columns)}")
 
-    # === STEP 10: Generate Identifier column ===
-    def generate_identifier(share_class, currency):
-        if pd.isna(share_class):
-            return ""
-        name = share_class.lower()
-        name = re.sub(r'ucits\s+etf', '', name, flags=re.IGNORECASE)
-        name = re.sub(r'[®¬Æ]', '', name).replace('class ', '').replace('accu', 'acc')
-        hedged_suffix = ''
-        match = re.search(r'([a-z]{3})\s*\(hedged\)', name)
-        if match:
-            hedged_suffix = match.group(1) + 'hedged'
-        name = re.sub(r'[^a-z]', '', name)
-        name = name.replace(currency.lower(), '') + currency.lower()
-        if hedged_suffix:
-            name += hedged_suffix
-        return name
-
-    df["Identifier"] = df.apply(
-        lambda row: generate_identifier(row.get("Share Class", ""), row.get("Currency", "")),
-        axis=1
-    )
+    # === STEP 9: Generate Identifier column ===
+    def generate_identifier(share_classes, currencies):
+        names = (
+            share_classes.fillna("").astype(str).str.lower()
+            .str.replace(_UCITS_ETF_RE, "", regex=True)
+            .str.replace(_SPECIAL_CHARS_RE, "", regex=True)
+            .str.replace("class ", "", regex=False)
+            .str.replace("accu", "acc", regex=False)
+        )
+        hedged_suffix = (names.str.extract(_HEDGED_RE, expand=False) + "hedged").fillna("")
+        names = names.str.replace(_NONALPHA_RE, "", regex=True)
+
+        # The currency moves to the end of the name (differs per row, so this part is a plain loop)
+        currencies = currencies.fillna("").astype(str).str.lower()
+        identifiers = pd.Series(
+            [name.replace(currency, "") + currency for name, currency in zip(names, currencies)],
+            index=share_classes.index
+        )
+        return (identifiers + hedged_suffix).where(share_classes.notna(), "")
+
+    df["Identifier"] = generate_identifier(df["Share Class"], df["Currency"])
 
-    # === STEP 11: Select relevant columns and rename ===
+    # === STEP 10: Select relevant columns and rename ===
 
     # Map expected original column names to cleaned ones using your standard:
     # UPPERCASE, spaces to underscores, no special characters
@@ -155,22 +162,12 @@ def process_monitoring_file(file):
         .str.replace(r"\s+", "_", regex=True)        # Replace any whitespace with underscores
     )
 
-    # === STEP 12: Type cleanup and coercion ===
+    # === STEP 11: Type cleanup and coercion ===
+    # Parsed once; stays datetime for the sort below and is formatted as YYYY-MM-DD after dedup
     summary_df["LAST_VALIDATED_DOCUMENT"] = pd.to_datetime(
         summary_df["LAST_VALIDATED_DOCUMENT"], dayfirst=True, errors="coerce"
     )
 
-    mask = summary_df["LAST_VALIDATED_DOCUMENT"].isna()
-    if mask.any():
-        fallback = pd.to_datetime(
-            summary_df.loc[mask, "LAST_VALIDATED_DOCUMENT"],
-            errors="coerce", dayfirst=True
-        )
-        summary_df.loc[mask, "LAST_VALIDATED_DOCUMENT"] = fallback
-
-    # Format date as YYYY-MM-DD
-    summary_df["LAST_VALIDATED_DOCUMENT"] = summary_df["LAST_VALIDATED_DOCUMENT"].dt.strftime("%Y-%m-%d")
-
     # Coerce SRRI columns to numeric
     summary_df["PREVIOUS_SRRI"] = pd.to_numeric(summary_df["PREVIOUS_SRRI"], errors="coerce")
     summary_df["LATEST_SRRI"] = pd.to_numeric(summary_df["LATEST_SRRI"], errors="coerce")
@@ -180,15 +177,15 @@ def process_monitoring_file(file):
         if summary_df[col].dtype == "object":
             summary_df[col] = summary_df[col].astype(str)
 
-    # === STEP 13: Deduplicate and format ===
-    summary_df = summary_df.sort_values("LAST_VALIDATED_DOCUMENT", ascending=False)
+    # === STEP 12: Deduplicate and format ===
+    # Newest document first; undated rows stay on top, as with the earlier sort on "nan" strings
+    summary_df = summary_df.sort_values("LAST_VALIDATED_DOCUMENT", ascending=False, na_position="first", kind="stable")
 
     duplicate_ids = summary_df["IDENTIFIER"][summary_df["IDENTIFIER"].duplicated()]
     if not duplicate_ids.empty:
         print(f"⚠️ Warning: Found duplicate Identifiers before deduplication:\n{duplicate_ids.tolist()}")
 
     summary_df = summary_df.drop_duplicates(subset="IDENTIFIER", keep="first")
-    summary_df["LAST_VALIDATED_DOCUMENT"] = pd.to_datetime(summary_df["LAST_VALIDATED_DOCUMENT"])
     summary_df["LAST_VALIDATED_DOCUMENT"] = summary_df["LAST_VALIDATED_DOCUMENT"].dt.strftime("%Y-%m-%d")
 
     summary_df.columns = (
@@ -198,9 +195,9 @@ def process_monitoring_file(file):
         .str.replace("-", "_")
     )
 
-    # === STEP 14: Export ===
+    # === STEP 13: Export ===
     summary_df.to_csv("output/srri_monitoring_tsfm.csv", index=False, encoding="utf-8-sig", date_format="%Y-%m-%d")
-    print(summary_df.dtypes)
+    logger.debug("dtypes=%s", summary_df.dtypes.to_dict())
 
 
     return summary_df